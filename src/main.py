@@ -1,8 +1,12 @@
 import os
 import sys
+import logging
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
+# Configure logging before the blueprints import and log their startup checks
+logging.basicConfig(level=logging.INFO)
+
 from flask import Flask, send_from_directory
 from src.models.user import db
 from src.routes.user import user_bp
@@ -1,14 +1,27 @@
 from flask import Blueprint, request, jsonify, current_app
 import os
+import asyncio
 import cv2
 import numpy as np
-from PIL import Image
 import base64
-import io
 from werkzeug.utils import secure_filename
 import hashlib
+import functools
+import json
+import tempfile
+import uuid
+import threading
+import queue
+import contextlib
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from blake3 import blake3
 from src.utils.gemini_integration import get_gemini_analyzer, is_gemini_available
+from src.utils.face_kernels import batch_pearson_i8
+
+logger = logging.getLogger(__name__)
 
 face_bp = Blueprint('face', __name__)
 
@@ -16,44 +29,189 @@ face_bp = Blueprint('face', __name__)
 UPLOAD_FOLDER = 'src/face_data/uploads'
 KNOWN_FACES_FOLDER = 'src/face_data/known_faces'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+_ALLOWED_SUFFIXES = tuple(f'.{ext}' for ext in sorted(ALLOWED_EXTENSIONS))
+DETECTION_MAX_SIDE = 640  # Long-edge cap (px) for the image passed to the face detector
+REFINE_PADDING = 0.5  # Margin, as a fraction of the box side, searched when refining a Haar box
+MATCH_THRESHOLD = 30  # Minimum confidence (%) for a gallery face to be reported
+MEDIUM_THRESHOLD = 50  # Best-match confidence (%) above which the threat is MEDIUM
+HIGH_THRESHOLD = 70  # Best-match confidence (%) above which the threat is HIGH
+FACE_SIZE = (64, 64)  # Size faces are resized to before feature extraction
+KNOWN_MATRIX_PATH = 'src/face_data/known_matrix.npy'
+KNOWN_INDEX_PATH = 'src/face_data/known_index.json'
+YUNET_MODEL_PATH = os.getenv('YUNET_MODEL_PATH', 'src/face_data/models/face_detection_yunet_2023mar.onnx')
+
+def check_simd_support():
+    """Warn if this CPU has AVX2 but the installed OpenCV build can't use it"""
+    cv2.setUseOptimized(True)
+    features = cv2.getCPUFeaturesLine()
+    logger.debug("OpenCV CPU features: %s", features)
+    
+    # 11 is cv::CPU_AVX2, which the Python bindings don't export. Non-x86 CPUs
+    # (e.g. ARM/NEON) report no AVX2 and are left alone
+    if cv2.checkHardwareSupport(11) and 'AVX2' not in features:
+        logger.warning(
+            "OpenCV was built without AVX2 dispatch (%s); face detection will run on "
+            "narrower SIMD paths. Rebuild it with: CMAKE_ARGS='-DCPU_DISPATCH=AVX2,AVX512_SKX' "
+            "pip install --no-binary opencv-python opencv-python", features)
+
+check_simd_support()
+
+# YuNet DNN (OpenCV >= 4.5.4) is used when its model file is present, Haar
+# Cascades otherwise. Both keep per-call image state internally, so a detector
+# serves one call at a time. Loaded detectors are pooled: each call checks one out
+# and returns it, and a new one is only loaded when every pooled one is in use.
+# Threads come and go (one per request under the threaded dev server, fresh ones
+# per gallery rebuild), so the pool outlives them rather than being per thread.
+_USE_YUNET = os.path.exists(YUNET_MODEL_PATH) and hasattr(cv2, 'FaceDetectorYN')
+_DETECTOR_POOL = queue.SimpleQueue()
+
+def load_face_detector():
+    """Load a new face detector"""
+    if _USE_YUNET:
+        return cv2.FaceDetectorYN.create(YUNET_MODEL_PATH, "", (0, 0), 0.7, 0.3, 5000)
+    return cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+
+@contextlib.contextmanager
+def face_detector():
+    """Check a face detector out of the pool for the duration of a with block"""
+    try:
+        detector = _DETECTOR_POOL.get_nowait()
+    except queue.Empty:
+        detector = load_face_detector()
+    try:
+        yield detector
+    finally:
+        _DETECTOR_POOL.put(detector)
+
+_DETECTOR_POOL.put(load_face_detector())
+
+# Run resize/cvtColor/detection through OpenCV's transparent API (cv2.UMat) when
+# an OpenCL device is available, offloading them to the GPU; plain Mats otherwise
+_USE_OPENCL = cv2.ocl.haveOpenCL()
+cv2.ocl.setUseOpenCL(_USE_OPENCL)
+
+# Background Gemini analyses, keyed by job id, oldest first
+GEMINI_JOB_LIMIT = 256
+_GEMINI_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix='gemini')
+_GEMINI_JOBS = OrderedDict()
+_GEMINI_JOBS_LOCK = threading.Lock()
+
+# Known-face feature cache: path -> (int8 centered features, sum, sum of squares),
+# or None if no face was found, invalidated per file when its (mtime, size)
+# changes. Rows are stacked into _KNOWN_MATRIX and their sums into _KNOWN_STATS so
+# a query is scored against the whole gallery with one int8 dot-product pass.
+# The gallery is persisted to KNOWN_MATRIX_PATH/KNOWN_INDEX_PATH and memory-mapped
+# on the next start, so workers skip detection and share the matrix pages.
+_KNOWN_CACHE: dict[str, tuple[np.ndarray, int, int] | None] = {}
+_KNOWN_MTIME: dict[str, tuple[float, int]] = {}
+_KNOWN_FILES: list[tuple[str, str]] = []
+_KNOWN_MATRIX = np.empty((0, 0), dtype=np.int8)
+_KNOWN_STATS = np.empty((0, 2), dtype=np.float64)
+_KNOWN_LOCK = threading.Lock()
 
 def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    return filename.lower().endswith(_ALLOWED_SUFFIXES)
 
-def detect_faces_opencv(image_path):
-    """Detect faces using OpenCV Haar Cascades"""
-    # Load the cascade
-    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-    
+def count_images(folder):
+    """Count allowed image files in a folder, 0 if it doesn't exist"""
+    try:
+        with os.scandir(folder) as entries:
+            return sum(1 for entry in entries if entry.is_file() and allowed_file(entry.name))
+    except FileNotFoundError:
+        return 0
+
+def to_device(img):
+    """Wrap an image in a cv2.UMat when OpenCL is in use, so OpenCV ops run on the GPU"""
+    return cv2.UMat(img) if _USE_OPENCL else img
+
+def detect_faces_opencv(image):
+    """Detect faces using OpenCV's YuNet detector, or Haar Cascades if it is unavailable
+
+    Accepts an image path or an already decoded BGR image array.
+    """
     # Read the image
-    img = cv2.imread(image_path)
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    img = cv2.imread(image) if isinstance(image, str) else image
+    
+    # Detect on a downscaled copy; cost scales with pixel count
+    h, w = img.shape[:2]
+    scale = min(1.0, DETECTION_MAX_SIDE / max(h, w))
+    sw, sh = round(w * scale), round(h * scale)  # As cv2.resize rounds fx/fy sizes
+    small = to_device(img)
+    if scale < 1:
+        small = cv2.resize(small, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
     
-    # Detect faces
-    faces = face_cascade.detectMultiScale(gray, 1.1, 4)
+    if _USE_YUNET:
+        # YuNet consumes BGR directly, no grayscale pass needed
+        with face_detector() as detector:
+            detector.setInputSize((sw, sh))
+            _, faces = detector.detect(small)
+        if isinstance(faces, cv2.UMat):
+            faces = faces.get()
+        boxes = np.empty((0, 4), dtype=np.float32) if faces is None else faces[:, :4]
+    else:
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        
+        # Detect faces
+        with face_detector() as detector:
+            faces = detector.detectMultiScale(gray, 1.1, 4)
+        boxes = np.asarray(faces, dtype=np.float32).reshape(-1, 4)
+    
+    # Map boxes back to the full-resolution image, clipped to its border
+    boxes = (boxes / scale).astype(int)
+    boxes[:, 0] = boxes[:, 0].clip(0, w - 1)
+    boxes[:, 1] = boxes[:, 1].clip(0, h - 1)
+    boxes[:, 2] = np.minimum(boxes[:, 2], w - boxes[:, 0])
+    boxes[:, 3] = np.minimum(boxes[:, 3], h - boxes[:, 1])
     
-    return faces, img
+    return boxes, img
+
+def refine_face_box(img, box):
+    """Re-detect a Haar box found on the downscaled image at full resolution
 
-def extract_face_features(image_path):
-    """Extract basic face features for comparison"""
-    faces, img = detect_faces_opencv(image_path)
+    Boxes from the downscaled pass land tens of pixels off the full-resolution
+    ones, moving match scores by up to ~18 points. Searching only a padded window
+    around the box, for faces at least half its size, restores the
+    full-resolution box at a fraction of the cost of a full-image pass. The
+    coarse box is kept if the window yields nothing.
+    """
+    x, y, w, h = box
+    pad = int(w * REFINE_PADDING)
+    x0, y0 = max(0, x - pad), max(0, y - pad)
+    window = cv2.cvtColor(img[y0:y + h + pad, x0:x + w + pad], cv2.COLOR_BGR2GRAY)
+    with face_detector() as detector:
+        faces = detector.detectMultiScale(window, 1.1, 4, minSize=(w // 2, h // 2))
+    if len(faces) == 0:
+        return box
+    fx, fy, fw, fh = faces[int((faces[:, 2] * faces[:, 3]).argmax())]
+    return x0 + fx, y0 + fy, fw, fh
+
+def extract_face_features(image):
+    """Extract basic face features for comparison from an image path or BGR array"""
+    faces, img = detect_faces_opencv(image)
     
     if len(faces) == 0:
         return None
     
     # Get the largest face (assuming it's the main subject)
-    largest_face = max(faces, key=lambda x: x[2] * x[3])
-    x, y, w, h = largest_face
+    areas = faces[:, 2] * faces[:, 3]
+    x, y, w, h = faces[int(areas.argmax())]
+    
+    # YuNet regresses its boxes; Haar boxes from a downscaled pass need refining
+    if not _USE_YUNET and max(img.shape[:2]) > DETECTION_MAX_SIDE:
+        x, y, w, h = refine_face_box(img, (x, y, w, h))
     
     # Extract face region
     face_roi = img[y:y+h, x:x+w]
     
     # Resize to standard size for comparison
-    face_roi = cv2.resize(face_roi, (100, 100))
+    face_roi = cv2.resize(to_device(face_roi), FACE_SIZE)
     
     # Convert to grayscale and flatten for simple comparison
     gray_face = cv2.cvtColor(face_roi, cv2.COLOR_BGR2GRAY)
     
+    if _USE_OPENCL:
+        face_roi, gray_face = face_roi.get(), gray_face.get()
+    
     return {
         'face_region': face_roi,
         'gray_face': gray_face,
@@ -61,26 +219,212 @@ def extract_face_features(image_path):
         'features': gray_face.flatten()
     }
 
-def compare_faces(features1, features2):
-    """Simple face comparison using correlation"""
-    if features1 is None or features2 is None:
-        return 0.0
+def quantize_features(features):
+    """Center a feature vector into int8, returning it with its sum and sum of squares
+
+    Pearson correlation is computed exactly from these on the quantized values.
+    """
+    centered = features.astype(np.int16) - int(features.mean())
+    row = centered.clip(-128, 127).astype(np.int8)
+    wide = row.astype(np.int64)
+    return row, int(wide.sum()), int(wide @ wide)
+
+def gallery_format():
+    """Settings that persisted gallery features were extracted with"""
+    return {
+        'face_size': list(FACE_SIZE),
+        'detector': 'yunet' if _USE_YUNET else 'haar',
+        'detection_max_side': DETECTION_MAX_SIDE,
+        'refine_padding': REFINE_PADDING,
+        'opencl': _USE_OPENCL,  # GPU kernels may round differently from the CPU ones
+    }
+
+def load_persisted_gallery():
+    """Populate the known-face cache from the persisted, memory-mapped gallery"""
+    global _KNOWN_FILES, _KNOWN_MATRIX, _KNOWN_STATS
+    
+    try:
+        with open(KNOWN_INDEX_PATH) as f:
+            index = json.load(f)
+        if index['format'] != gallery_format():
+            return
+        
+        matrix = np.load(KNOWN_MATRIX_PATH, mmap_mode='r')
+        files, stats = [], []
+        for item in index['files']:
+            path = os.path.join(KNOWN_FACES_FOLDER, item['name'])
+            if item['row'] is None:
+                _KNOWN_CACHE[path] = None
+            else:
+                _KNOWN_CACHE[path] = (matrix[item['row']], item['sum'], item['sq_sum'])
+                files.append((item['name'], path))
+                stats.append((item['sum'], item['sq_sum']))
+            _KNOWN_MTIME[path] = (item['mtime'], item['size'])
+        
+        if len(files) != matrix.shape[0]:
+            raise ValueError(f"{len(files)} indexed faces but {matrix.shape[0]} matrix rows")
+        # The two files are replaced separately, so check they were saved together
+        if index['matrix_digest'] != matrix_digest(matrix):
+            raise ValueError("matrix does not match its index")
+        
+        _KNOWN_FILES = files
+        _KNOWN_MATRIX = matrix if files else np.empty((0, 0), dtype=np.int8)
+        _KNOWN_STATS = np.array(stats, dtype=np.float64).reshape(-1, 2)
+    except FileNotFoundError:
+        pass  # Nothing persisted yet
+    except (OSError, ValueError, KeyError, TypeError, IndexError) as e:
+        logger.warning(f"Ignoring persisted gallery: {e}")
+        _KNOWN_CACHE.clear()
+        _KNOWN_MTIME.clear()
+
+def matrix_digest(matrix):
+    """Content digest of a gallery matrix, recorded in its index"""
+    return blake3(np.ascontiguousarray(matrix)).hexdigest()
+
+def write_atomic(path, write, mode='wb'):
+    """Write a file through a uniquely named temp file and rename it into place"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode) as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def save_persisted_gallery():
+    """Persist the known-face matrix and its index, each replaced atomically"""
+    rows = {path: i for i, (_, path) in enumerate(_KNOWN_FILES)}
+    index = {
+        'format': gallery_format(),
+        'matrix_digest': matrix_digest(_KNOWN_MATRIX),
+        'files': [{
+            'name': os.path.basename(path),
+            'mtime': _KNOWN_MTIME[path][0],
+            'size': _KNOWN_MTIME[path][1],
+            'row': rows.get(path),
+            'sum': entry[1] if entry is not None else None,
+            'sq_sum': entry[2] if entry is not None else None
+        } for path, entry in sorted(_KNOWN_CACHE.items())]
+    }
+    
+    try:
+        # Temp files are unique per writer, as several cold workers may save at
+        # once; a reader seeing one writer's matrix with another's index rejects
+        # the pair by its digest
+        write_atomic(KNOWN_MATRIX_PATH, lambda f: np.save(f, _KNOWN_MATRIX))
+        write_atomic(KNOWN_INDEX_PATH, lambda f: json.dump(index, f), mode='w')
+    except OSError as e:
+        logger.warning(f"Failed to persist known-face gallery: {e}")
+
+def load_known_faces():
+    """Return the known-face (filename, path) list, int8 feature matrix and row stats"""
+    global _KNOWN_FILES, _KNOWN_MATRIX, _KNOWN_STATS
+    
+    with _KNOWN_LOCK:
+        if not _KNOWN_MTIME:
+            load_persisted_gallery()
+        
+        seen = set()
+        stale = {}
+        try:
+            # DirEntry caches the type and stat, one syscall per entry
+            with os.scandir(KNOWN_FACES_FOLDER) as entries:
+                for entry in entries:
+                    if not entry.is_file() or not allowed_file(entry.name):
+                        continue
+                    
+                    stat = entry.stat()
+                    key = (stat.st_mtime, stat.st_size)
+                    seen.add(entry.path)
+                    
+                    # Only re-run detection for new or modified files
+                    if _KNOWN_MTIME.get(entry.path) != key:
+                        stale[entry.path] = key
+        except FileNotFoundError:
+            pass  # No known faces folder; cached entries are dropped below
+        
+        # Decode and detect stale files in parallel; OpenCV releases the GIL and each
+        # worker thread uses its own detector
+        changed = bool(stale)
+        if stale:
+            with ThreadPoolExecutor(max_workers=min(len(stale), os.cpu_count() or 1)) as executor:
+                extracted = executor.map(extract_face_features, stale)
+                for (path, key), known_features in zip(stale.items(), extracted):
+                    _KNOWN_CACHE[path] = (None if known_features is None
+                                          else quantize_features(known_features['features']))
+                    _KNOWN_MTIME[path] = key
+        
+        # Drop files that were removed from the folder
+        for path in list(_KNOWN_CACHE):
+            if path not in seen:
+                del _KNOWN_CACHE[path]
+                del _KNOWN_MTIME[path]
+                changed = True
+        
+        if changed:
+            rows = [(path, entry) for path, entry in sorted(_KNOWN_CACHE.items()) if entry is not None]
+            _KNOWN_FILES = [(os.path.basename(path), path) for path, _ in rows]
+            if rows:
+                _KNOWN_MATRIX = np.vstack([row for _, (row, _, _) in rows])
+                _KNOWN_STATS = np.array([(total, sq_total) for _, (_, total, sq_total) in rows],
+                                        dtype=np.float64)
+            else:
+                _KNOWN_MATRIX = np.empty((0, 0), dtype=np.int8)
+                _KNOWN_STATS = np.empty((0, 2), dtype=np.float64)
+            save_persisted_gallery()
+        
+        return _KNOWN_FILES, _KNOWN_MATRIX, _KNOWN_STATS
+
+def match_known_faces(uploaded_features, threshold=MATCH_THRESHOLD):
+    """Compare uploaded face features against all known faces, best match first"""
+    known_files, known_matrix, known_stats = load_known_faces()
+    if not known_files:
+        return []
     
-    # Calculate correlation coefficient
-    correlation = np.corrcoef(features1['features'], features2['features'])[0, 1]
+    # One compiled int8 pass scores the query against the whole gallery, taking
+    # Pearson correlation from the dot products and the precomputed row sums
+    query, query_sum, query_sq = quantize_features(uploaded_features['features'])
+    confidences = batch_pearson_i8(known_matrix, known_stats, query, query_sum, query_sq) * 100
     
-    # Convert to confidence score (0-100)
-    confidence = max(0, correlation * 100) if not np.isnan(correlation) else 0
+    # Threshold for potential match, then sort by confidence
+    hits = np.where(confidences > threshold)[0]
+    hits = hits[np.argsort(-confidences[hits], kind='stable')]
     
-    return confidence
+    return [{
+        'filename': known_files[i][0],
+        'confidence': round(float(confidences[i]), 2),
+        'path': known_files[i][1]
+    } for i in hits]
+
+def save_snapshot(filepath, image_bytes):
+    """Write snapshot bytes to disk, logging instead of raising on failure"""
+    try:
+        with open(filepath, 'wb') as f:
+            f.write(image_bytes)
+    except OSError as e:
+        logger.warning(f"Failed to save snapshot {filepath}: {e}")
+
+@functools.lru_cache(maxsize=1024)
+def fetch_json(url):
+    """Fetch a JSON document, cached per URL; None if not found
+
+    Only 200 and 404 responses are cached. Request errors and any other status,
+    such as rate limiting (403/429) or server errors, raise so they are retried.
+    """
+    response = requests.get(url, timeout=5)
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    if response.status_code != 200:
+        raise requests.HTTPError(f"Unexpected status {response.status_code} for {url}", response=response)
+    return response.json()
 
 def search_gravatar(email_hash):
     """Search for Gravatar profile"""
     try:
         url = f"https://www.gravatar.com/{email_hash}.json"
-        response = requests.get(url, timeout=5)
-        if response.status_code == 200:
-            return response.json()
+        return fetch_json(url)
     except:
         pass
     return None
@@ -89,9 +433,8 @@ def search_github_avatar(username):
     """Search for GitHub avatar"""
     try:
         url = f"https://api.github.com/users/{username}"
-        response = requests.get(url, timeout=5)
-        if response.status_code == 200:
-            user_data = response.json()
+        user_data = fetch_json(url)
+        if user_data:
             return {
                 'avatar_url': user_data.get('avatar_url'),
                 'name': user_data.get('name'),
@@ -103,6 +446,92 @@ def search_github_avatar(username):
         pass
     return None
 
+def osint_gather(name_guess):
+    """Run the Gravatar and GitHub lookups for a name concurrently"""
+    traditional_osint = []
+    
+    # Try some common email patterns for Gravatar
+    common_domains = ['gmail.com', 'yahoo.com', 'hotmail.com']
+    emails = [f"{name_guess}@{domain}" for domain in common_domains]
+    
+    with ThreadPoolExecutor(max_workers=len(emails) + 1) as executor:
+        gravatar_futures = [executor.submit(search_gravatar,
+                                            hashlib.md5(email.encode(), usedforsecurity=False).hexdigest())
+                            for email in emails]
+        github_future = executor.submit(search_github_avatar, name_guess)
+        
+        # Keep the first domain, in order, that has a profile
+        for email, future in zip(emails, gravatar_futures):
+            gravatar_data = future.result()
+            if gravatar_data:
+                traditional_osint.append({
+                    'source': 'Gravatar',
+                    'email': email,
+                    'data': gravatar_data
+                })
+                break
+        
+        # Try GitHub lookup
+        github_data = github_future.result()
+        if github_data:
+            traditional_osint.append({
+                'source': 'GitHub',
+                'username': name_guess,
+                'data': github_data
+            })
+    
+    return traditional_osint
+
+def run_gemini_pipeline(filepath, image_bytes, matches):
+    """Run Gemini face, OSINT and threat analysis for an uploaded image's contents"""
+    # Face and OSINT analysis run concurrently, then the threat assessment
+    results = asyncio.run(get_gemini_analyzer().analyze_all(
+        filepath, {'matches': matches}, matches, image_bytes=image_bytes))
+    gemini_results = {}
+    
+    if results['face_analysis'].get('success'):
+        gemini_results['face_analysis'] = results['face_analysis']['analysis']
+    
+    if results['osint_analysis'].get('success'):
+        gemini_results['osint_analysis'] = results['osint_analysis']['osint_analysis']
+    
+    if results['threat_assessment'].get('success'):
+        gemini_results['threat_assessment'] = results['threat_assessment']['threat_assessment']
+    
+    return gemini_results
+
+def submit_gemini_job(filepath, image_bytes, matches):
+    """Start the Gemini pipeline in the background and return its job id
+
+    The image is passed as bytes read at upload time, since a later upload with
+    the same filename may overwrite the file before a worker picks the job up.
+    """
+    job_id = uuid.uuid4().hex[:12]
+    future = _GEMINI_EXECUTOR.submit(run_gemini_pipeline, filepath, image_bytes, matches)
+    
+    with _GEMINI_JOBS_LOCK:
+        _GEMINI_JOBS[job_id] = future
+        # Forget the oldest jobs so unpolled results don't accumulate
+        while len(_GEMINI_JOBS) > GEMINI_JOB_LIMIT:
+            _GEMINI_JOBS.popitem(last=False)
+    
+    return job_id
+
+def gemini_threat_level(threat_data):
+    """Extract (threat_level, confidence_score) from a Gemini threat assessment"""
+    threat_level = "LOW"
+    confidence_score = 0
+    
+    if isinstance(threat_data, dict):
+        if 'structured' in threat_data:
+            threat_level = threat_data['structured'].get('threat_level', 'LOW')
+            confidence_score = threat_data['structured'].get('confidence_score', 0)
+        elif 'threat_level' in threat_data:
+            threat_level = threat_data.get('threat_level', 'LOW')
+            confidence_score = threat_data.get('confidence_score', 0)
+    
+    return threat_level, confidence_score
+
 @face_bp.route('/upload', methods=['POST'])
 def upload_face():
     """Handle face image upload and analysis with Gemini enhancement"""
@@ -118,6 +547,9 @@ def upload_face():
             filename = secure_filename(file.filename)
             filepath = os.path.join(UPLOAD_FOLDER, filename)
             file.save(filepath)
+            # Keep this upload's contents for the background Gemini job
+            with open(filepath, 'rb') as f:
+                image_bytes = f.read()
             
             # Extract features from uploaded image (traditional method)
             uploaded_features = extract_face_features(filepath)
@@ -126,112 +558,38 @@ def upload_face():
                 return jsonify({'error': 'No face detected in uploaded image'}), 400
             
             # Compare with known faces (traditional method)
-            matches = []
-            known_faces_dir = KNOWN_FACES_FOLDER
-            
-            if os.path.exists(known_faces_dir):
-                for known_file in os.listdir(known_faces_dir):
-                    if allowed_file(known_file):
-                        known_path = os.path.join(known_faces_dir, known_file)
-                        known_features = extract_face_features(known_path)
-                        
-                        if known_features is not None:
-                            confidence = compare_faces(uploaded_features, known_features)
-                            if confidence > 30:  # Threshold for potential match
-                                matches.append({
-                                    'filename': known_file,
-                                    'confidence': round(confidence, 2),
-                                    'path': known_path
-                                })
-            
-            # Sort matches by confidence
-            matches.sort(key=lambda x: x['confidence'], reverse=True)
+            matches = match_known_faces(uploaded_features)
             
-            # Enhanced analysis with Gemini API
-            gemini_results = {}
-            if is_gemini_available():
-                analyzer = get_gemini_analyzer()
-                
-                # Perform Gemini face analysis
-                face_analysis = analyzer.analyze_face_image(filepath)
-                if face_analysis.get('success'):
-                    gemini_results['face_analysis'] = face_analysis['analysis']
-                
-                # Perform Gemini OSINT analysis
-                osint_analysis = analyzer.enhance_osint_search(filepath, {'matches': matches})
-                if osint_analysis.get('success'):
-                    gemini_results['osint_analysis'] = osint_analysis['osint_analysis']
-                
-                # Generate enhanced threat assessment
-                threat_assessment = analyzer.generate_threat_assessment(
-                    face_analysis.get('analysis', {}),
-                    osint_analysis.get('osint_analysis', {}),
-                    matches
-                )
-                if threat_assessment.get('success'):
-                    gemini_results['threat_assessment'] = threat_assessment['threat_assessment']
+            # Enhanced analysis with Gemini API runs in the background; the
+            # client polls /gemini/<job_id> for the results
+            gemini_job_id = submit_gemini_job(filepath, image_bytes, matches) if is_gemini_available() else None
             
             # Traditional OSINT lookup (basic implementation)
             traditional_osint = []
             
-            # Try some common email patterns for Gravatar
             if matches:
                 # Extract name from filename for demo purposes
                 name_guess = matches[0]['filename'].split('.')[0].lower()
-                common_domains = ['gmail.com', 'yahoo.com', 'hotmail.com']
-                
-                for domain in common_domains:
-                    email = f"{name_guess}@{domain}"
-                    email_hash = hashlib.md5(email.encode()).hexdigest()
-                    gravatar_data = search_gravatar(email_hash)
-                    
-                    if gravatar_data:
-                        traditional_osint.append({
-                            'source': 'Gravatar',
-                            'email': email,
-                            'data': gravatar_data
-                        })
-                        break
-                
-                # Try GitHub lookup
-                github_data = search_github_avatar(name_guess)
-                if github_data:
-                    traditional_osint.append({
-                        'source': 'GitHub',
-                        'username': name_guess,
-                        'data': github_data
-                    })
+                traditional_osint = osint_gather(name_guess)
             
-            # Calculate enhanced threat level
+            # Traditional threat assessment; the Gemini job reports its own
             threat_level = "LOW"
             confidence_score = 0
             
-            # Use Gemini threat assessment if available
-            if gemini_results.get('threat_assessment'):
-                threat_data = gemini_results['threat_assessment']
-                if isinstance(threat_data, dict):
-                    if 'structured' in threat_data:
-                        threat_level = threat_data['structured'].get('threat_level', 'LOW')
-                        confidence_score = threat_data['structured'].get('confidence_score', 0)
-                    elif 'threat_level' in threat_data:
-                        threat_level = threat_data.get('threat_level', 'LOW')
-                        confidence_score = threat_data.get('confidence_score', 0)
-            else:
-                # Fallback to traditional threat assessment
-                if matches and len(matches) > 0:
-                    max_confidence = max([m['confidence'] for m in matches])
-                    if max_confidence > 70:
-                        threat_level = "HIGH"
-                        confidence_score = 85
-                    elif max_confidence > 50:
-                        threat_level = "MEDIUM"
-                        confidence_score = 65
-                    else:
-                        confidence_score = 35
-                
-                if traditional_osint:
-                    threat_level = "HIGH"  # Any OSINT hit increases threat level
-                    confidence_score = max(confidence_score, 80)
+            if matches and len(matches) > 0:
+                max_confidence = max([m['confidence'] for m in matches])
+                if max_confidence > HIGH_THRESHOLD:
+                    threat_level = "HIGH"
+                    confidence_score = 85
+                elif max_confidence > MEDIUM_THRESHOLD:
+                    threat_level = "MEDIUM"
+                    confidence_score = 65
+                else:
+                    confidence_score = 35
+            
+            if traditional_osint:
+                threat_level = "HIGH"  # Any OSINT hit increases threat level
+                confidence_score = max(confidence_score, 80)
             
             # Prepare response
             response_data = {
@@ -245,9 +603,9 @@ def upload_face():
                 'gemini_enabled': is_gemini_available()
             }
             
-            # Add Gemini results if available
-            if gemini_results:
-                response_data['gemini_analysis'] = gemini_results
+            # Add Gemini job if one was started
+            if gemini_job_id:
+                response_data['gemini_job_id'] = gemini_job_id
             
             return jsonify(response_data)
         
@@ -265,50 +623,35 @@ def process_webcam():
             return jsonify({'error': 'No image data provided'}), 400
         
         # Decode base64 image
-        image_data = data['image'].split(',')[1]  # Remove data:image/jpeg;base64,
+        image_data = data['image'].split(',', 1)[1]  # Remove data:image/jpeg;base64,
         image_bytes = base64.b64decode(image_data)
         
-        # Save temporary file
-        filename = f"webcam_{hashlib.md5(image_bytes).hexdigest()[:8]}.jpg"
-        filepath = os.path.join(UPLOAD_FOLDER, filename)
+        # Decode in memory instead of round-tripping through disk
+        img = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            return jsonify({'error': 'Invalid image data'}), 400
         
-        with open(filepath, 'wb') as f:
-            f.write(image_bytes)
+        # Save a copy of the snapshot off the request path
+        filename = f"webcam_{blake3(image_bytes).hexdigest(length=4)}.jpg"
+        filepath = os.path.join(UPLOAD_FOLDER, filename)
+        threading.Thread(target=save_snapshot, args=(filepath, image_bytes), daemon=True).start()
         
         # Process same as upload
-        uploaded_features = extract_face_features(filepath)
+        uploaded_features = extract_face_features(img)
         
         if uploaded_features is None:
             return jsonify({'error': 'No face detected in webcam image'}), 400
         
         # Same matching logic as upload
-        matches = []
-        known_faces_dir = KNOWN_FACES_FOLDER
-        
-        if os.path.exists(known_faces_dir):
-            for known_file in os.listdir(known_faces_dir):
-                if allowed_file(known_file):
-                    known_path = os.path.join(known_faces_dir, known_file)
-                    known_features = extract_face_features(known_path)
-                    
-                    if known_features is not None:
-                        confidence = compare_faces(uploaded_features, known_features)
-                        if confidence > 30:
-                            matches.append({
-                                'filename': known_file,
-                                'confidence': round(confidence, 2),
-                                'path': known_path
-                            })
-        
-        matches.sort(key=lambda x: x['confidence'], reverse=True)
+        matches = match_known_faces(uploaded_features)
         
         # Calculate threat level
         threat_level = "LOW"
         if matches and len(matches) > 0:
             max_confidence = max([m['confidence'] for m in matches])
-            if max_confidence > 70:
+            if max_confidence > HIGH_THRESHOLD:
                 threat_level = "HIGH"
-            elif max_confidence > 50:
+            elif max_confidence > MEDIUM_THRESHOLD:
                 threat_level = "MEDIUM"
         
         return jsonify({
@@ -322,19 +665,42 @@ def process_webcam():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@face_bp.route('/gemini/<job_id>', methods=['GET'])
+def get_gemini_job(job_id):
+    """Poll a background Gemini analysis started by an upload"""
+    try:
+        with _GEMINI_JOBS_LOCK:
+            future = _GEMINI_JOBS.get(job_id)
+        
+        if future is None:
+            return jsonify({'error': 'Unknown Gemini job'}), 404
+        
+        if not future.done():
+            return jsonify({'status': 'pending'})
+        
+        gemini_results = future.result()
+        response_data = {
+            'status': 'complete',
+            'gemini_analysis': gemini_results
+        }
+        
+        # Use Gemini threat assessment if available
+        if gemini_results.get('threat_assessment'):
+            threat_level, confidence_score = gemini_threat_level(gemini_results['threat_assessment'])
+            response_data['threat_level'] = threat_level
+            response_data['confidence_score'] = confidence_score
+        
+        return jsonify(response_data)
+        
+    except Exception as e:
+        return jsonify({'status': 'failed', 'error': str(e)}), 500
+
 @face_bp.route('/status', methods=['GET'])
 def get_status():
     """Get application status and statistics"""
     try:
-        known_faces_count = 0
-        if os.path.exists(KNOWN_FACES_FOLDER):
-            known_faces_count = len([f for f in os.listdir(KNOWN_FACES_FOLDER) 
-                                   if allowed_file(f)])
-        
-        uploads_count = 0
-        if os.path.exists(UPLOAD_FOLDER):
-            uploads_count = len([f for f in os.listdir(UPLOAD_FOLDER) 
-                               if allowed_file(f)])
+        known_faces_count = count_images(KNOWN_FACES_FOLDER)
+        uploads_count = count_images(UPLOAD_FOLDER)
         
         # Check Gemini availability
         gemini_available = is_gemini_available()
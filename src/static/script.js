@@ -1,6 +1,8 @@
 // Global variables
 let webcamStream = null;
 let currentImageFile = null;
+let geminiSectionMarkup = null;  // Tab markup saved while the loading state is shown
+let currentGeminiJobId = null;  // Gemini job of the results on screen; other polls are dropped
 
 // DOM elements
 const fileInput = document.getElementById('file-input');
@@ -201,6 +203,12 @@ async function analyzeImage() {
 }
 
 function displayResults(data) {
+    // Stop a pending Gemini poll from drawing over these results
+    if (currentGeminiJobId !== null) {
+        currentGeminiJobId = null;
+        displayGeminiAnalysis(null);
+    }
+    
     // Update threat level
     updateThreatLevel(data.threat_level);
     
@@ -630,6 +638,7 @@ document.head.appendChild(styleSheet);
 // Gemini Analysis Functions
 function displayGeminiAnalysis(geminiData) {
     const geminiSection = document.getElementById('gemini-analysis');
+    hideGeminiLoading();
     
     if (!geminiData || Object.keys(geminiData).length === 0) {
         geminiSection.style.display = 'none';
@@ -821,12 +830,20 @@ function updateThreatLevelWithConfidence(level, confidence) {
 
 // Enhanced displayResults function to handle Gemini data
 function displayResultsEnhanced(data) {
+    // Polls for any earlier upload's job are ignored from here on
+    currentGeminiJobId = data.gemini_job_id || null;
+    
     // Update threat level with confidence
     updateThreatLevelWithConfidence(data.threat_level, data.confidence_score);
     
-    // Display Gemini analysis if available
+    // Display Gemini analysis if available, or poll for it if still running
     if (data.gemini_analysis) {
         displayGeminiAnalysis(data.gemini_analysis);
+    } else if (data.gemini_job_id) {
+        showGeminiLoading();
+        pollGeminiAnalysis(data.gemini_job_id, data);
+    } else {
+        displayGeminiAnalysis(null);
     }
     
     // Display traditional face matches
@@ -846,6 +863,53 @@ function displayResultsEnhanced(data) {
     resultsSection.scrollIntoView({ behavior: 'smooth' });
 }
 
+// Poll a background Gemini analysis until it completes, then refresh the
+// threat level shown for the upload response it belongs to
+function pollGeminiAnalysis(jobId, uploadData, attempt = 0) {
+    if (jobId !== currentGeminiJobId) {
+        return;
+    }
+    
+    if (attempt >= 80) {
+        console.error('Gemini analysis timed out');
+        displayGeminiAnalysis(null);
+        return;
+    }
+    
+    fetch(`/api/face/gemini/${jobId}`)
+    .then(response => response.json())
+    .then(data => {
+        // A newer upload has replaced these results while the request was out
+        if (jobId !== currentGeminiJobId) {
+            return;
+        }
+        
+        if (data.status === 'pending') {
+            setTimeout(() => pollGeminiAnalysis(jobId, uploadData, attempt + 1), 1500);
+            return;
+        }
+        
+        if (data.status === 'complete') {
+            displayGeminiAnalysis(data.gemini_analysis);
+            if (data.threat_level) {
+                uploadData.threat_level = data.threat_level;
+                uploadData.confidence_score = data.confidence_score;
+                updateThreatLevelWithConfidence(data.threat_level, data.confidence_score);
+                displayEnhancedAnalysisSummary(uploadData);
+            }
+        } else {
+            console.error('Gemini analysis failed:', data.error);
+            displayGeminiAnalysis(null);
+        }
+    })
+    .catch(error => {
+        console.error('Error:', error);
+        if (jobId === currentGeminiJobId) {
+            displayGeminiAnalysis(null);
+        }
+    });
+}
+
 function displayTraditionalOSINT(results) {
     const container = document.getElementById('osint-container');
     
@@ -950,6 +1014,9 @@ if (typeof analyzeImage !== 'undefined') {
 // Add loading state for Gemini analysis
 function showGeminiLoading() {
     const geminiSection = document.getElementById('gemini-analysis');
+    if (geminiSectionMarkup === null) {
+        geminiSectionMarkup = geminiSection.innerHTML;
+    }
     geminiSection.style.display = 'block';
     geminiSection.innerHTML = `
         <div class="analysis-header">
@@ -962,3 +1029,10 @@ function showGeminiLoading() {
     `;
 }
 
+// Put the analysis tabs back after showGeminiLoading replaced them
+function hideGeminiLoading() {
+    if (geminiSectionMarkup !== null) {
+        document.getElementById('gemini-analysis').innerHTML = geminiSectionMarkup;
+        geminiSectionMarkup = null;
+    }
+}
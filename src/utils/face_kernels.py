@@ -0,0 +1,62 @@
+"""
+Numba-compiled numeric kernels for face feature comparison
+"""
+
+import math
+
+import numba
+import numpy as np
+
+
+# Single-threaded on purpose: the kernels are called from concurrent request
+# threads, which Numba's workqueue threading layer (used when neither TBB nor
+# OpenMP is installed) aborts on, and the pass is memory-bound anyway
+@numba.njit(fastmath=True, cache=True)
+def batch_dot_i8(matrix, query):
+    """Integer dot product of every int8 row of matrix with an int8 query vector"""
+    rows, cols = matrix.shape
+    out = np.empty(rows, dtype=np.int64)
+    for i in range(rows):
+        acc = np.int32(0)
+        for j in range(cols):
+            acc += np.int32(matrix[i, j]) * np.int32(query[j])
+        out[i] = acc
+    return out
+
+
+@numba.njit(fastmath=True, cache=True)
+def batch_pearson_i8(matrix, stats, query, query_sum, query_sq):
+    """Pearson correlation of every int8 row of matrix with an int8 query vector
+
+    stats holds each row's (sum, sum of squares). The dot products and the
+    normalization run in one compiled pass, with no temporaries per row;
+    rows or queries with zero variance score 0.
+    """
+    rows, cols = matrix.shape
+    dots = batch_dot_i8(matrix, query)
+    query_var = cols * query_sq - query_sum * query_sum
+    out = np.zeros(rows)
+    for i in range(rows):
+        row_sum = stats[i, 0]
+        den = math.sqrt((cols * stats[i, 1] - row_sum * row_sum) * query_var)
+        if den > 0:
+            out[i] = (cols * dots[i] - row_sum * query_sum) / den
+    return out
+
+
+def warm_up():
+    """Compile (or load from the on-disk cache) each kernel for the dtypes used at runtime
+
+    Called at import so the first request after a worker boots doesn't pay the JIT cost.
+    """
+    matrix = np.zeros((1, 16), dtype=np.int8)
+    stats = np.zeros((1, 2), dtype=np.float64)
+    batch_pearson_i8(matrix, stats, matrix[0], 0, 0)
+
+    # Read-only specialization, used for the memory-mapped gallery
+    readonly = matrix.copy()
+    readonly.setflags(write=False)
+    batch_pearson_i8(readonly, stats, matrix[0], 0, 0)
+
+
+warm_up()
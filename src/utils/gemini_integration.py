@@ -4,23 +4,393 @@ Provides advanced image analysis, face analysis, and OSINT capabilities using Go
 """
 
 import os
-import base64
-import io
-from PIL import Image
+import asyncio
+import cv2
+import numpy as np
 import google.generativeai as genai
-from typing import Dict, List, Optional, Any
-import json
+from typing import Dict, List, Optional, Any, Tuple
+import orjson
+import re
+from string import Template
+import hashlib
+import threading
+import copy
 import logging
+from collections import OrderedDict
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Prompt instructions are module constants sent at the start of each request, with
+# the per-call data (image, context JSON) last, so repeated calls share an identical
+# prefix that Gemini's implicit context caching can reuse
+_FACE_PROMPT_PREFIX = """
+Analyze this image for facial recognition and OSINT purposes. Provide a detailed analysis including:
+
+1. FACE DETECTION:
+- Number of faces detected
+- Primary face location and size
+- Face quality assessment (lighting, angle, clarity)
+
+2. FACIAL ATTRIBUTES:
+- Estimated age range
+- Gender presentation
+- Ethnicity/appearance
+- Facial hair (if any)
+- Glasses or accessories
+- Emotional expression
+
+3. CONTEXTUAL ANALYSIS:
+- Background/setting description
+- Clothing or uniform details
+- Any visible text, logos, or identifiers
+- Photo quality and likely source (professional, social media, ID photo, etc.)
+
+4. OSINT POTENTIAL:
+- Unique identifying features
+- Potential reverse image search indicators
+- Social media profile likelihood
+- Professional/corporate context clues
+
+5. PRIVACY RISK ASSESSMENT:
+- How easily identifiable is this person?
+- What additional information could be gathered?
+- Potential privacy concerns
+
+Format your response as structured JSON with clear categories, in a single ```json code block.
+Be thorough but respectful in your analysis.
+"""
+
+_OSINT_PROMPT_PREFIX = """
+As an OSINT (Open Source Intelligence) expert, analyze this image to suggest search strategies and potential data sources for identification purposes. This is for educational/awareness purposes only.
+
+Provide analysis in these categories:
+
+1. REVERSE IMAGE SEARCH STRATEGY:
+- Best search engines to use (Google Images, TinEye, Yandex, etc.)
+- Optimal image cropping suggestions
+- Alternative search approaches
+
+2. SOCIAL MEDIA INDICATORS:
+- Platform-specific clues (Instagram, LinkedIn, Facebook style)
+- Profile picture likelihood
+- Background location clues
+
+3. PROFESSIONAL/INSTITUTIONAL CLUES:
+- Corporate/organizational indicators
+- Uniform or badge analysis
+- Professional setting context
+
+4. GEOGRAPHIC/LOCATION CLUES:
+- Background architecture or landmarks
+- License plates, signs, or text
+- Cultural or regional indicators
+
+5. TEMPORAL CLUES:
+- Photo age estimation
+- Fashion/style dating
+- Technology visible in image
+
+6. SEARCH KEYWORDS:
+- Suggested search terms
+- Boolean search combinations
+- Alternative descriptive terms
+
+7. PRIVACY IMPLICATIONS:
+- How this information could be misused
+- Privacy protection recommendations
+- Ethical considerations
+
+Format as structured JSON in a single ```json code block. Be educational and emphasize responsible use.
+"""
+
+_THREAT_PROMPT_PREFIX = """
+As a privacy and security expert, analyze the data provided after these instructions to provide a comprehensive threat assessment for facial recognition privacy risks.
+
+Provide a comprehensive threat assessment including:
+
+1. OVERALL THREAT LEVEL: (LOW/MEDIUM/HIGH/CRITICAL)
+
+2. RISK FACTORS:
+- Image quality and identifiability
+- OSINT potential and data availability
+- Matching confidence levels
+- Context and background information
+
+3. SPECIFIC VULNERABILITIES:
+- What makes this person identifiable
+- Potential attack vectors
+- Data correlation possibilities
+
+4. MITIGATION RECOMMENDATIONS:
+- Privacy protection steps
+- Image sharing best practices
+- Digital footprint reduction
+
+5. EDUCATIONAL INSIGHTS:
+- What this demonstrates about privacy risks
+- How facial recognition technology works
+- Real-world implications
+
+6. CONFIDENCE SCORE: (0-100)
+- How confident are you in this assessment
+- What factors increase/decrease confidence
+
+Format as structured JSON in a single ```json code block. Be educational and focus on privacy awareness.
+"""
+
+GEMINI_MODEL = 'gemini-1.5-flash'
+
+# Returned (as a copy) by every analysis while the API isn't configured
+_DISABLED_ERROR = {"error": "Gemini API not available"}
+
+# GenerativeModel instances shared by every analyzer, keyed on
+# (sha256 of the API key, model name), so re-creating an analyzer is cheap.
+# genai.configure() is process-global and models pick up the configured client
+# at their first request, so the SDK is re-configured whenever an analyzer asks
+# for a different key than the last one; using several keys concurrently is
+# not supported.
+_MODEL_CACHE: Dict[tuple, genai.GenerativeModel] = {}
+_MODEL_CACHE_LOCK = threading.Lock()
+_CONFIGURED_KEY_HASH = None
+
+# Images are sent to the API as JPEG, downscaled to this long-edge cap (px)
+API_IMAGE_MAX_SIDE = 1024
+API_JPEG_QUALITY = 85
+
+# Per-call prompt parts sent after the static prefixes
+_OSINT_CONTEXT_TMPL = Template("Previous analysis context: $context")
+_THREAT_DATA_TMPL = Template(
+    "FACE ANALYSIS DATA:\n$face\n\n"
+    "OSINT ANALYSIS DATA:\n$osint\n\n"
+    "TRADITIONAL MATCHING RESULTS:\n$matches"
+)
+
+# Bump when the prompts change so cached results from the old ones aren't reused
+PROMPT_VERSION = 3
+
+# LRU cache of successful Gemini results, keyed on (content hash, PROMPT_VERSION,
+# method). Repeated analyses of the same image skip the API round-trip.
+RESULT_CACHE_SIZE = int(os.getenv('GEMINI_RESULT_CACHE_SIZE', '256'))
+_RESULT_CACHE = OrderedDict()
+_RESULT_CACHE_LOCK = threading.Lock()
+
+def _try_prepare_image_for_api(image_bytes: bytes) -> Optional[Dict[str, Any]]:
+    """_prepare_image_for_api, or None so the analysis itself reports the error"""
+    try:
+        return _prepare_image_for_api(image_bytes)
+    except (ValueError, cv2.error):
+        return None
+
+def _read_image_bytes(image_path: str) -> bytes:
+    """Read an image file's raw bytes"""
+    with open(image_path, 'rb') as f:
+        return f.read()
+
+def _try_read_image_bytes(image_path: str) -> Optional[bytes]:
+    """Read an image file's raw bytes, or None so the analysis itself reports the error"""
+    try:
+        return _read_image_bytes(image_path)
+    except OSError:
+        return None
+
+def _get_model(api_key: str, model_name: str) -> genai.GenerativeModel:
+    """Return the shared GenerativeModel for an API key, configuring the SDK for that key"""
+    global _CONFIGURED_KEY_HASH
+    key_hash = hashlib.sha256(api_key.encode()).hexdigest()
+    with _MODEL_CACHE_LOCK:
+        # The SDK keeps one client (one persistent gRPC channel) per configure()
+        # and shares it between models; configure() discards it, so only call it
+        # when the key changes
+        if key_hash != _CONFIGURED_KEY_HASH:
+            genai.configure(api_key=api_key, transport='grpc')
+            _CONFIGURED_KEY_HASH = key_hash
+        
+        model = _MODEL_CACHE.get((key_hash, model_name))
+        if model is None:
+            model = _MODEL_CACHE[(key_hash, model_name)] = genai.GenerativeModel(model_name)
+        return model
+
+def _dumps(obj: Any, sort_keys: bool = False) -> bytes:
+    """Serialize prompt data to compact JSON, accepting numpy scalars and arrays"""
+    option = orjson.OPT_SERIALIZE_NUMPY | (orjson.OPT_SORT_KEYS if sort_keys else 0)
+    return orjson.dumps(obj, option=option)
+
+def _cache_key(method: str, *payloads: bytes) -> tuple:
+    """Build a result cache key from a method name and the content it was called with"""
+    digest = hashlib.sha256()
+    for payload in payloads:
+        digest.update(hashlib.sha256(payload).digest())
+    return (digest.hexdigest(), PROMPT_VERSION, method)
+
+def _cache_get(key: tuple) -> Optional[Dict[str, Any]]:
+    """Return a copy of a cached result and mark it most recently used, or None"""
+    with _RESULT_CACHE_LOCK:
+        result = _RESULT_CACHE.get(key)
+        if result is None:
+            return None
+        _RESULT_CACHE.move_to_end(key)
+    # Callers own what they get back, so mutating it can't alter the cached entry
+    return copy.deepcopy(result)
+
+def _cache_put(key: tuple, result: Dict[str, Any]) -> None:
+    """Store a successful result, evicting the least recently used ones over the cap"""
+    if not result.get("success"):
+        return
+    result = copy.deepcopy(result)
+    with _RESULT_CACHE_LOCK:
+        _RESULT_CACHE[key] = result
+        _RESULT_CACHE.move_to_end(key)
+        while len(_RESULT_CACHE) > RESULT_CACHE_SIZE:
+            _RESULT_CACHE.popitem(last=False)
+
+def _prepare_image_for_api(image_bytes: bytes) -> Dict[str, Any]:
+    """Re-encode image bytes as a downscaled JPEG blob for generate_content"""
+    buf = np.frombuffer(image_bytes, dtype=np.uint8)
+    
+    # JPEGs go straight through IMREAD_COLOR, which applies the EXIF orientation
+    # so Gemini sees what the face detector sees. Other formats are decoded once
+    # with IMREAD_UNCHANGED to keep any alpha channel, and only decoded again
+    # with IMREAD_COLOR when they are opaque and carry EXIF data to orient by.
+    image = None
+    if not image_bytes.startswith(b'\xff\xd8'):
+        image = cv2.imdecode(buf, cv2.IMREAD_UNCHANGED)
+        has_alpha = image is not None and image.ndim == 3 and image.shape[2] == 4
+        if image is not None and not has_alpha and (b'Exif' in image_bytes or b'eXIf' in image_bytes):
+            image = None
+    
+    if image is None:
+        image = cv2.imdecode(buf, cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError("Could not decode image")
+    else:
+        if image.dtype != np.uint8:
+            image = cv2.convertScaleAbs(image, alpha=255 / np.iinfo(image.dtype).max)
+        
+        if has_alpha:
+            # Flatten transparency onto white; JPEG has no alpha channel
+            alpha = image[:, :, 3:].astype(np.float32) / 255
+            image = (image[:, :, :3] * alpha + 255 * (1 - alpha)).astype(np.uint8)
+        elif image.ndim == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    
+    h, w = image.shape[:2]
+    scale = API_IMAGE_MAX_SIDE / max(h, w)
+    if scale < 1:
+        size = (max(1, round(w * scale)), max(1, round(h * scale)))
+        image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    
+    _, buf = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, API_JPEG_QUALITY])
+    return {"mime_type": "image/jpeg", "data": buf.tobytes()}
+
+def _generate_json(model: genai.GenerativeModel, parts: List[Any]) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """
+    Stream a response, returning its text and embedded JSON object (or None)
+    
+    Reading stops as soon as a complete fenced JSON block has arrived. A bare
+    brace object may still be followed by a fenced one, which takes priority,
+    so without a fence the whole response is read before extracting.
+    """
+    chunks = []
+    for chunk in model.generate_content(parts, stream=True):
+        chunks.append(chunk.text)
+        # A fenced block can only complete in a chunk that closes a fence
+        if '`' in chunks[-1]:
+            match = _JSON_BLOCK_RE.search(''.join(chunks))
+            if match is not None and match.group(1) is not None:
+                data = _load_json_object(match.group(1))
+                if data is not None:
+                    return ''.join(chunks), data
+    text = ''.join(chunks)
+    return text, _extract_json(text)
+
+def _header_re(keywords) -> re.Pattern:
+    """Compile a regex matching whole lines that contain one of the keywords"""
+    return re.compile(r'^[^\n]*?(?:' + '|'.join(map(re.escape, keywords)) + r')[^\n]*$', re.I | re.M)
+
+# Section header keywords of the plain-text fallbacks, mapped to result keys. A
+# header is any line containing one of the keywords, matched case-insensitively;
+# a line with several keywords belongs to the one listed first.
+_ANALYSIS_SECTIONS = {
+    'FACE DETECTION': 'face_detection',
+    'FACIAL ATTRIBUTES': 'facial_attributes',
+    'CONTEXTUAL': 'contextual_analysis',
+    'OSINT': 'osint_potential',
+    'PRIVACY': 'privacy_risk'
+}
+_SECTION_RE = _header_re(_ANALYSIS_SECTIONS)
+
+_OSINT_SECTIONS = {
+    'REVERSE IMAGE': 'reverse_image_search',
+    'SOCIAL MEDIA': 'social_media_indicators',
+    'PROFESSIONAL': 'professional_clues',
+    'GEOGRAPHIC': 'geographic_clues',
+    'LOCATION': 'geographic_clues',
+    'KEYWORDS': 'search_keywords',
+    'PRIVACY': 'privacy_implications'
+}
+_OSINT_SECTION_RE = _header_re(_OSINT_SECTIONS)
+
+_THREAT_SECTIONS = {
+    'RISK FACTORS': 'risk_factors',
+    'VULNERABILITIES': 'vulnerabilities',
+    'RECOMMENDATIONS': 'recommendations',
+    'MITIGATION': 'recommendations',
+    'INSIGHTS': 'insights',
+    'EDUCATIONAL': 'insights'
+}
+_THREAT_SECTION_RE = _header_re(_THREAT_SECTIONS)
+
+# The first ```json fenced block, or else the outermost braces in the text. Both
+# branches are anchored so the fence is preferred wherever it appears.
+_JSON_BLOCK_RE = re.compile(r'\A(?:.*?```(?:json)?\s*(\{.*?\})\s*```|.*?(\{.*\}))', re.S)
+
+def _load_json_object(raw: str) -> Optional[Dict[str, Any]]:
+    """Parse raw JSON text, or return None if it isn't a valid object"""
+    try:
+        data = orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        return None
+    return data if isinstance(data, dict) else None
+
+def _extract_json(text: str) -> Optional[Dict[str, Any]]:
+    """Return the JSON object embedded in a model response, or None if there isn't a valid one"""
+    match = _JSON_BLOCK_RE.search(text)
+    if match is None:
+        return None
+    return _load_json_object(match.group(1) or match.group(2))
+
+# Threat levels, most severe first; when a plain-text assessment mentions several
+# (incidental wording, an echoed "LOW/MEDIUM/HIGH/CRITICAL" scale) the most severe
+# wins, so a threat is never underrated
+_THREAT_LEVELS = ('CRITICAL', 'HIGH', 'MEDIUM', 'LOW')
+
+# Threat level (searched in the uppercased text) and confidence score ("85%",
+# "85/100") in a plain-text threat assessment
+_THREAT_LEVEL_RE = re.compile(r'\b(' + '|'.join(_THREAT_LEVELS) + r')\b')
+_CONFIDENCE_RE = re.compile(r'(\d+)\s*(?:/\s*100|%)')
+
+def _parse_sections(text: str, section_re: re.Pattern, section_names: Dict[str, str]) -> Dict[str, str]:
+    """Split text on the header lines section_re matches, joining each section's body lines with spaces"""
+    bodies = {name: [] for name in section_names.values()}
+    headers = list(section_re.finditer(text))
+    
+    # A section runs from the end of its header line to the next header
+    for header, following in zip(headers, headers[1:] + [None]):
+        end = following.start() if following else len(text)
+        lines = text[header.end():end].split('\n')
+        header_line = header.group(0).upper()
+        name = next(name for keyword, name in section_names.items() if keyword in header_line)
+        bodies[name].extend(filter(None, map(str.strip, lines)))
+    
+    return {name: ' '.join(lines) for name, lines in bodies.items()}
+
 class GeminiAnalyzer:
     """
     Enhanced face and image analysis using Google's Gemini API
     """
     
+    __slots__ = ('api_key', 'model', 'enabled')
+    
     def __init__(self, api_key: Optional[str] = None):
         """
         Initialize Gemini analyzer
@@ -35,9 +405,7 @@ class GeminiAnalyzer:
             return
             
         try:
-            genai.configure(api_key=self.api_key)
-            self.model = genai.GenerativeModel('gemini-1.5-flash')
-            self.vision_model = genai.GenerativeModel('gemini-1.5-flash')
+            self.model = _get_model(self.api_key, GEMINI_MODEL)
             self.enabled = True
             logger.info("Gemini API initialized successfully")
         except Exception as e:
@@ -48,188 +416,107 @@ class GeminiAnalyzer:
         """Check if Gemini integration is enabled"""
         return self.enabled
     
-    def analyze_face_image(self, image_path: str) -> Dict[str, Any]:
+    def analyze_face_image(self, image_path: str, image_bytes: Optional[bytes] = None,
+                           prepared_image: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         Analyze a face image using Gemini's vision capabilities
         
         Args:
             image_path: Path to the image file
+            image_bytes: Contents of the image file, if already read
+            prepared_image: _prepare_image_for_api result for image_bytes, if already made
             
         Returns:
             Dictionary containing analysis results
         """
         if not self.enabled:
-            return {"error": "Gemini API not available"}
+            return dict(_DISABLED_ERROR)
             
         try:
-            # Load and prepare image
-            image = Image.open(image_path)
-            
-            # Create detailed prompt for face analysis
-            prompt = """
-            Analyze this image for facial recognition and OSINT purposes. Provide a detailed analysis including:
-            
-            1. FACE DETECTION:
-            - Number of faces detected
-            - Primary face location and size
-            - Face quality assessment (lighting, angle, clarity)
-            
-            2. FACIAL ATTRIBUTES:
-            - Estimated age range
-            - Gender presentation
-            - Ethnicity/appearance
-            - Facial hair (if any)
-            - Glasses or accessories
-            - Emotional expression
+            # Load the image once; its bytes key the result cache
+            if image_bytes is None:
+                image_bytes = _read_image_bytes(image_path)
             
-            3. CONTEXTUAL ANALYSIS:
-            - Background/setting description
-            - Clothing or uniform details
-            - Any visible text, logos, or identifiers
-            - Photo quality and likely source (professional, social media, ID photo, etc.)
+            cache_key = _cache_key('analyze_face_image', image_bytes)
+            cached = _cache_get(cache_key)
+            if cached is not None:
+                return cached
             
-            4. OSINT POTENTIAL:
-            - Unique identifying features
-            - Potential reverse image search indicators
-            - Social media profile likelihood
-            - Professional/corporate context clues
+            image = prepared_image or _prepare_image_for_api(image_bytes)
             
-            5. PRIVACY RISK ASSESSMENT:
-            - How easily identifiable is this person?
-            - What additional information could be gathered?
-            - Potential privacy concerns
-            
-            Format your response as structured JSON with clear categories.
-            Be thorough but respectful in your analysis.
-            """
-            
-            response = self.vision_model.generate_content([prompt, image])
-            
-            # Parse response
-            analysis_text = response.text
+            analysis_text, analysis_data = _generate_json(self.model, [_FACE_PROMPT_PREFIX, image])
             
-            # Try to extract JSON if present, otherwise structure the text response
-            try:
-                # Look for JSON in the response
-                if '{' in analysis_text and '}' in analysis_text:
-                    json_start = analysis_text.find('{')
-                    json_end = analysis_text.rfind('}') + 1
-                    json_str = analysis_text[json_start:json_end]
-                    analysis_data = json.loads(json_str)
-                else:
-                    # Structure the text response
-                    analysis_data = {
-                        "raw_analysis": analysis_text,
-                        "structured": self._parse_analysis_text(analysis_text)
-                    }
-            except json.JSONDecodeError:
+            # Use the JSON block if present, otherwise structure the text response
+            if analysis_data is None:
                 analysis_data = {
                     "raw_analysis": analysis_text,
                     "structured": self._parse_analysis_text(analysis_text)
                 }
             
-            return {
+            result = {
                 "success": True,
                 "analysis": analysis_data,
-                "model_used": "gemini-1.5-flash"
+                "model_used": GEMINI_MODEL
             }
+            _cache_put(cache_key, result)
+            return result
             
         except Exception as e:
             logger.error(f"Gemini face analysis failed: {e}")
             return {"error": f"Analysis failed: {str(e)}"}
     
-    def enhance_osint_search(self, image_path: str, context: Dict[str, Any] = None) -> Dict[str, Any]:
+    def enhance_osint_search(self, image_path: str, context: Dict[str, Any] = None,
+                             image_bytes: Optional[bytes] = None,
+                             prepared_image: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         Use Gemini to enhance OSINT search capabilities
         
         Args:
             image_path: Path to the image file
             context: Additional context from previous analysis
+            image_bytes: Contents of the image file, if already read
+            prepared_image: _prepare_image_for_api result for image_bytes, if already made
             
         Returns:
             Enhanced OSINT search suggestions and analysis
         """
         if not self.enabled:
-            return {"error": "Gemini API not available"}
+            return dict(_DISABLED_ERROR)
             
         try:
-            image = Image.open(image_path)
-            
-            context_info = ""
-            if context:
-                context_info = f"Previous analysis context: {json.dumps(context, indent=2)}"
-            
-            prompt = f"""
-            As an OSINT (Open Source Intelligence) expert, analyze this image to suggest search strategies and potential data sources for identification purposes. This is for educational/awareness purposes only.
-            
-            {context_info}
-            
-            Provide analysis in these categories:
-            
-            1. REVERSE IMAGE SEARCH STRATEGY:
-            - Best search engines to use (Google Images, TinEye, Yandex, etc.)
-            - Optimal image cropping suggestions
-            - Alternative search approaches
-            
-            2. SOCIAL MEDIA INDICATORS:
-            - Platform-specific clues (Instagram, LinkedIn, Facebook style)
-            - Profile picture likelihood
-            - Background location clues
-            
-            3. PROFESSIONAL/INSTITUTIONAL CLUES:
-            - Corporate/organizational indicators
-            - Uniform or badge analysis
-            - Professional setting context
-            
-            4. GEOGRAPHIC/LOCATION CLUES:
-            - Background architecture or landmarks
-            - License plates, signs, or text
-            - Cultural or regional indicators
+            if image_bytes is None:
+                image_bytes = _read_image_bytes(image_path)
             
-            5. TEMPORAL CLUES:
-            - Photo age estimation
-            - Fashion/style dating
-            - Technology visible in image
+            context_info = _dumps(context).decode() if context else ""
+            cache_key = _cache_key('enhance_osint_search', image_bytes, context_info.encode())
+            cached = _cache_get(cache_key)
+            if cached is not None:
+                return cached
             
-            6. SEARCH KEYWORDS:
-            - Suggested search terms
-            - Boolean search combinations
-            - Alternative descriptive terms
+            image = prepared_image or _prepare_image_for_api(image_bytes)
             
-            7. PRIVACY IMPLICATIONS:
-            - How this information could be misused
-            - Privacy protection recommendations
-            - Ethical considerations
+            # Static instructions first, per-call context and image last
+            parts = [_OSINT_PROMPT_PREFIX]
+            if context_info:
+                parts.append(_OSINT_CONTEXT_TMPL.substitute(context=context_info))
+            parts.append(image)
             
-            Format as structured JSON. Be educational and emphasize responsible use.
-            """
-            
-            response = self.vision_model.generate_content([prompt, image])
-            analysis_text = response.text
+            analysis_text, osint_data = _generate_json(self.model, parts)
             
             # Parse response similar to face analysis
-            try:
-                if '{' in analysis_text and '}' in analysis_text:
-                    json_start = analysis_text.find('{')
-                    json_end = analysis_text.rfind('}') + 1
-                    json_str = analysis_text[json_start:json_end]
-                    osint_data = json.loads(json_str)
-                else:
-                    osint_data = {
-                        "raw_analysis": analysis_text,
-                        "structured": self._parse_osint_text(analysis_text)
-                    }
-            except json.JSONDecodeError:
+            if osint_data is None:
                 osint_data = {
                     "raw_analysis": analysis_text,
                     "structured": self._parse_osint_text(analysis_text)
                 }
             
-            return {
+            result = {
                 "success": True,
                 "osint_analysis": osint_data,
-                "model_used": "gemini-1.5-flash"
+                "model_used": GEMINI_MODEL
             }
+            _cache_put(cache_key, result)
+            return result
             
         except Exception as e:
             logger.error(f"Gemini OSINT analysis failed: {e}")
@@ -249,181 +536,164 @@ class GeminiAnalyzer:
             Enhanced threat level assessment
         """
         if not self.enabled:
-            return {"error": "Gemini API not available"}
+            return dict(_DISABLED_ERROR)
             
         try:
-            prompt = f"""
-            As a privacy and security expert, analyze the following data to provide a comprehensive threat assessment for facial recognition privacy risks.
-            
-            FACE ANALYSIS DATA:
-            {json.dumps(face_analysis, indent=2)}
-            
-            OSINT ANALYSIS DATA:
-            {json.dumps(osint_analysis, indent=2)}
-            
-            TRADITIONAL MATCHING RESULTS:
-            {json.dumps(traditional_matches, indent=2)}
-            
-            Provide a comprehensive threat assessment including:
-            
-            1. OVERALL THREAT LEVEL: (LOW/MEDIUM/HIGH/CRITICAL)
-            
-            2. RISK FACTORS:
-            - Image quality and identifiability
-            - OSINT potential and data availability
-            - Matching confidence levels
-            - Context and background information
-            
-            3. SPECIFIC VULNERABILITIES:
-            - What makes this person identifiable
-            - Potential attack vectors
-            - Data correlation possibilities
-            
-            4. MITIGATION RECOMMENDATIONS:
-            - Privacy protection steps
-            - Image sharing best practices
-            - Digital footprint reduction
-            
-            5. EDUCATIONAL INSIGHTS:
-            - What this demonstrates about privacy risks
-            - How facial recognition technology works
-            - Real-world implications
-            
-            6. CONFIDENCE SCORE: (0-100)
-            - How confident are you in this assessment
-            - What factors increase/decrease confidence
-            
-            Format as structured JSON. Be educational and focus on privacy awareness.
-            """
-            
-            response = self.model.generate_content(prompt)
-            assessment_text = response.text
+            # Identical inputs give the same assessment, so memoize on their JSON
+            inputs = _dumps([face_analysis, osint_analysis, traditional_matches], sort_keys=True)
+            cache_key = _cache_key('generate_threat_assessment', inputs)
+            cached = _cache_get(cache_key)
+            if cached is not None:
+                return cached
+            
+            # Static instructions first, per-call analysis data last, as compact JSON
+            parts = [
+                _THREAT_PROMPT_PREFIX,
+                _THREAT_DATA_TMPL.substitute(
+                    face=_dumps(face_analysis).decode(),
+                    osint=_dumps(osint_analysis).decode(),
+                    matches=_dumps(traditional_matches).decode()
+                )
+            ]
+            
+            assessment_text, assessment_data = _generate_json(self.model, parts)
             
             # Parse response
-            try:
-                if '{' in assessment_text and '}' in assessment_text:
-                    json_start = assessment_text.find('{')
-                    json_end = assessment_text.rfind('}') + 1
-                    json_str = assessment_text[json_start:json_end]
-                    assessment_data = json.loads(json_str)
-                else:
-                    assessment_data = {
-                        "raw_assessment": assessment_text,
-                        "structured": self._parse_threat_text(assessment_text)
-                    }
-            except json.JSONDecodeError:
+            if assessment_data is None:
                 assessment_data = {
                     "raw_assessment": assessment_text,
                     "structured": self._parse_threat_text(assessment_text)
                 }
             
-            return {
+            result = {
                 "success": True,
                 "threat_assessment": assessment_data,
-                "model_used": "gemini-1.5-flash"
+                "model_used": GEMINI_MODEL
             }
+            _cache_put(cache_key, result)
+            return result
             
         except Exception as e:
             logger.error(f"Gemini threat assessment failed: {e}")
             return {"error": f"Threat assessment failed: {str(e)}"}
     
-    def _parse_analysis_text(self, text: str) -> Dict[str, Any]:
-        """Parse unstructured analysis text into categories"""
-        sections = {
-            "face_detection": "",
-            "facial_attributes": "",
-            "contextual_analysis": "",
-            "osint_potential": "",
-            "privacy_risk": ""
+    async def analyze_face_image_async(self, image_path: str, image_bytes: Optional[bytes] = None,
+                                       prepared_image: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Async version of analyze_face_image, run in a worker thread"""
+        return await asyncio.to_thread(self.analyze_face_image, image_path, image_bytes, prepared_image)
+    
+    async def enhance_osint_search_async(self, image_path: str, context: Dict[str, Any] = None,
+                                         image_bytes: Optional[bytes] = None,
+                                         prepared_image: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Async version of enhance_osint_search, run in a worker thread"""
+        return await asyncio.to_thread(self.enhance_osint_search, image_path, context, image_bytes,
+                                       prepared_image)
+    
+    async def generate_threat_assessment_async(self, face_analysis: Dict[str, Any], osint_analysis: Dict[str, Any],
+                                               traditional_matches: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Async version of generate_threat_assessment, run in a worker thread"""
+        return await asyncio.to_thread(self.generate_threat_assessment, face_analysis, osint_analysis,
+                                       traditional_matches)
+    
+    async def analyze_all(self, image_path: str, context: Dict[str, Any] = None,
+                          traditional_matches: List[Dict[str, Any]] = None,
+                          image_bytes: Optional[bytes] = None) -> Dict[str, Any]:
+        """
+        Run face and OSINT analysis concurrently, then the threat assessment on their results
+        
+        Args:
+            image_path: Path to the image file
+            context: Additional context for the OSINT analysis
+            traditional_matches: Results from traditional face matching
+            image_bytes: Contents of the image file, if already read
+            
+        Returns:
+            Dictionary with the face_analysis, osint_analysis and threat_assessment results
+        """
+        # Read and re-encode the image once, off the event loop, for both analyses
+        if image_bytes is None:
+            image_bytes = await asyncio.to_thread(_try_read_image_bytes, image_path)
+        prepared_image = None
+        if image_bytes is not None:
+            prepared_image = await asyncio.to_thread(_try_prepare_image_for_api, image_bytes)
+        
+        face_analysis, osint_analysis = await asyncio.gather(
+            self.analyze_face_image_async(image_path, image_bytes, prepared_image),
+            self.enhance_osint_search_async(image_path, context, image_bytes, prepared_image)
+        )
+        
+        threat_assessment = await self.generate_threat_assessment_async(
+            face_analysis.get('analysis', {}),
+            osint_analysis.get('osint_analysis', {}),
+            traditional_matches or []
+        )
+        
+        return {
+            "face_analysis": face_analysis,
+            "osint_analysis": osint_analysis,
+            "threat_assessment": threat_assessment
         }
+    
+    async def analyze_batch(self, image_paths: List[str], max_concurrency: int = 5) -> List[Dict[str, Any]]:
+        """
+        Run analyze_all over several images, at most max_concurrency at a time
         
-        current_section = None
-        for line in text.split('\n'):
-            line = line.strip()
-            if 'FACE DETECTION' in line.upper():
-                current_section = 'face_detection'
-            elif 'FACIAL ATTRIBUTES' in line.upper():
-                current_section = 'facial_attributes'
-            elif 'CONTEXTUAL' in line.upper():
-                current_section = 'contextual_analysis'
-            elif 'OSINT' in line.upper():
-                current_section = 'osint_potential'
-            elif 'PRIVACY' in line.upper():
-                current_section = 'privacy_risk'
-            elif current_section and line:
-                sections[current_section] += line + " "
+        Files are read ahead of the analysis workers, so reading the next
+        images overlaps with the API calls for the current ones.
         
-        return sections
+        Args:
+            image_paths: Paths to the image files
+            max_concurrency: Maximum number of images analyzed in parallel
+            
+        Returns:
+            analyze_all results, in the same order as image_paths
+        """
+        results = [None] * len(image_paths)
+        queue = asyncio.Queue(maxsize=max_concurrency)
+        
+        async def read_images():
+            for index, image_path in enumerate(image_paths):
+                image_bytes = await asyncio.to_thread(_try_read_image_bytes, image_path)
+                await queue.put((index, image_path, image_bytes))
+            for _ in range(max_concurrency):
+                await queue.put(None)
+        
+        async def analyze_images():
+            while (item := await queue.get()) is not None:
+                index, image_path, image_bytes = item
+                results[index] = await self.analyze_all(image_path, image_bytes=image_bytes)
+        
+        await asyncio.gather(read_images(), *(analyze_images() for _ in range(max_concurrency)))
+        return results
+    
+    def _parse_analysis_text(self, text: str) -> Dict[str, Any]:
+        """Parse unstructured analysis text into categories"""
+        return _parse_sections(text, _SECTION_RE, _ANALYSIS_SECTIONS)
     
     def _parse_osint_text(self, text: str) -> Dict[str, Any]:
         """Parse unstructured OSINT text into categories"""
-        sections = {
-            "reverse_image_search": "",
-            "social_media_indicators": "",
-            "professional_clues": "",
-            "geographic_clues": "",
-            "search_keywords": "",
-            "privacy_implications": ""
-        }
-        
-        current_section = None
-        for line in text.split('\n'):
-            line = line.strip()
-            if 'REVERSE IMAGE' in line.upper():
-                current_section = 'reverse_image_search'
-            elif 'SOCIAL MEDIA' in line.upper():
-                current_section = 'social_media_indicators'
-            elif 'PROFESSIONAL' in line.upper():
-                current_section = 'professional_clues'
-            elif 'GEOGRAPHIC' in line.upper() or 'LOCATION' in line.upper():
-                current_section = 'geographic_clues'
-            elif 'KEYWORDS' in line.upper():
-                current_section = 'search_keywords'
-            elif 'PRIVACY' in line.upper():
-                current_section = 'privacy_implications'
-            elif current_section and line:
-                sections[current_section] += line + " "
-        
-        return sections
+        return _parse_sections(text, _OSINT_SECTION_RE, _OSINT_SECTIONS)
     
     def _parse_threat_text(self, text: str) -> Dict[str, Any]:
         """Parse unstructured threat assessment text"""
         sections = {
             "threat_level": "UNKNOWN",
-            "risk_factors": "",
-            "vulnerabilities": "",
-            "recommendations": "",
-            "insights": "",
+            **_parse_sections(text, _THREAT_SECTION_RE, _THREAT_SECTIONS),
             "confidence_score": 0
         }
         
-        # Extract threat level
-        for level in ['CRITICAL', 'HIGH', 'MEDIUM', 'LOW']:
-            if level in text.upper():
+        # Extract threat level, the most severe one mentioned
+        mentioned = set(_THREAT_LEVEL_RE.findall(text.upper()))
+        for level in _THREAT_LEVELS:
+            if level in mentioned:
                 sections['threat_level'] = level
                 break
         
         # Extract confidence score
-        import re
-        confidence_match = re.search(r'(\d+)(?:/100|\%)', text)
+        confidence_match = _CONFIDENCE_RE.search(text)
         if confidence_match:
             sections['confidence_score'] = int(confidence_match.group(1))
         
-        # Parse sections
-        current_section = None
-        for line in text.split('\n'):
-            line = line.strip()
-            if 'RISK FACTORS' in line.upper():
-                current_section = 'risk_factors'
-            elif 'VULNERABILITIES' in line.upper():
-                current_section = 'vulnerabilities'
-            elif 'RECOMMENDATIONS' in line.upper() or 'MITIGATION' in line.upper():
-                current_section = 'recommendations'
-            elif 'INSIGHTS' in line.upper() or 'EDUCATIONAL' in line.upper():
-                current_section = 'insights'
-            elif current_section and line:
-                sections[current_section] += line + " "
-        
         return sections
 
 # Global instance
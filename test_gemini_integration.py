@@ -124,6 +124,14 @@ def test_gemini_integration():
             print("   ✅ _parse_threat_text works correctly")
         else:
             print(f"   ⚠️  _parse_threat_text unexpected result: {threat_parsed}")
+        
+        # Incidental lower levels before the verdict must not underrate it
+        threat_text = "Risk factors: low lighting.\nOVERALL THREAT LEVEL: HIGH"
+        threat_parsed = analyzer_instance._parse_threat_text(threat_text)
+        if threat_parsed.get('threat_level') == 'HIGH':
+            print("   ✅ _parse_threat_text picks the most severe level mentioned")
+        else:
+            print(f"   ⚠️  _parse_threat_text underrated the threat: {threat_parsed}")
             
     except Exception as e:
         print(f"   ❌ Utility functions test failed: {e}")